@@ -1,23 +1,34 @@
 """LangGraph agent implementation."""
 
-from typing import Annotated, Dict, List, Literal, TypedDict
+import functools
+import logging
+from typing import Annotated, Dict, List, Literal, Tuple, TypedDict
 
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
-from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+from langchain_core.runnables import Runnable
 from langgraph.graph import END, StateGraph
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
+from langgraph.graph.state import CompiledStateGraph
 
-from .model import model
-from .prompt import FALLBACK_SYSTEM_PROMPT, get_prompty_client
-from .tools import AVAILABLE_TOOLS
-from .utils import change_file_to_url, sanitize_and_validate_messages
+from .model import get_model
+from .prompt import get_system_prompt, render_dynamic_suffix
+from .tools import AVAILABLE_TOOLS, TOOL_SCHEMAS
+from .utils import (
+    add_messages_with_token_counts,
+    change_file_to_url,
+    prepare_messages_for_llm,
+    trim_by_cached_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+# Compiled graphs keyed by the identity of the tools they were built with
+_GRAPH_CACHE: Dict[Tuple[int, ...], CompiledStateGraph] = {}
 
 
 class AgentState(TypedDict):
     """State for the agent graph."""
 
-    messages: Annotated[List[BaseMessage], add_messages]
+    messages: Annotated[List[BaseMessage], add_messages_with_token_counts]
 
 
 def should_continue(state: AgentState) -> Literal["tools", "end"]:
@@ -29,19 +40,50 @@ def should_continue(state: AgentState) -> Literal["tools", "end"]:
     Returns:
         str: Next node to execute ("tools" or "end")
     """
-    messages = state["messages"]
-    last_message = messages[-1]
+    last_message = state["messages"][-1]
+
+    # If the LLM makes no tool call, we stop (reply to the user)
+    if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
+        return "end"
+    tool_calls = last_message.tool_calls
+
+    # Otherwise, we route to the "tools" node
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("LLM Tool Calls (%d):", len(tool_calls))
+        for i, tool_call in enumerate(tool_calls, 1):
+            logger.debug(
+                "  %d. %s Args: %s",
+                i,
+                tool_call.get("name", "unknown"),
+                tool_call.get("args", {}),
+            )
+    return "tools"
+
+
+@functools.lru_cache(maxsize=1)
+def get_model_with_tools() -> Runnable:
+    """Get the default model with all tools bound.
+
+    Tools are static for the process lifetime, so their precomputed OpenAI
+    schemas are bound once on first use instead of on every model call.
+
+    Returns:
+        Runnable: Model runnable with AVAILABLE_TOOLS bound
+    """
+    return get_model().bind(tools=TOOL_SCHEMAS)
+
+
+@functools.lru_cache(maxsize=2)
+def _get_system_message(prompt: str) -> SystemMessage:
+    """Build a system message once per distinct prompt text.
+
+    Args:
+        prompt: System prompt text
 
-    # If the LLM makes a tool call, then we route to the "tools" node
-    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-        # Debug: Print tool calls
-        print(f"\n🔧 LLM Tool Calls ({len(last_message.tool_calls)}):")
-        for i, tool_call in enumerate(last_message.tool_calls, 1):
-            print(f"  {i}. {tool_call.get('name', 'unknown')}")
-            print(f"     Args: {tool_call.get('args', {})}")
-        return "tools"
-    # Otherwise, we stop (reply to the user)
-    return "end"
+    Returns:
+        SystemMessage: Cached system message
+    """
+    return SystemMessage(content=prompt)
 
 
 def call_model(state: AgentState, config=None) -> Dict[str, List[BaseMessage]]:
@@ -57,50 +99,46 @@ def call_model(state: AgentState, config=None) -> Dict[str, List[BaseMessage]]:
     messages = state["messages"]
 
     # Trim messages to fit within token limit
-    messages = trim_messages(
-        state["messages"],
-        strategy="last",
-        token_counter=count_tokens_approximately,
-        max_tokens=120_000,
-        start_on="human",
-        end_on=("human", "tool"),
-    )
+    messages = trim_by_cached_tokens(messages, max_tokens=120_000)
 
-    # Sanitize and validate messages to ensure proper tool call/response pairing
-    messages = sanitize_and_validate_messages(messages)
+    # Ensure proper tool call/response pairing, ending on a complete turn
+    messages = prepare_messages_for_llm(messages)
 
     # Convert chatbot://{id} URLs to temporary blob URLs with SAS tokens
     messages = change_file_to_url(messages)
 
-    print(messages)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("messages=%r", messages)
 
-    try:
-        prompty = get_prompty_client()
-        prompt = prompty.get_prompt("Main Chat Agent")
-        if prompt is None:
-            prompt = FALLBACK_SYSTEM_PROMPT
-    except Exception as e:
-        print(f"Failed to get prompt: {e}")
-        prompt = FALLBACK_SYSTEM_PROMPT
-
-    system_msg = SystemMessage(content=prompt.strip())
-    messages = [system_msg] + messages
+    # `messages` is a fresh list built above, so prepend in place. The static
+    # prompt goes first so the provider can reuse its cached prefix.
+    messages[:0] = (
+        _get_system_message(get_system_prompt()),
+        _get_system_message(render_dynamic_suffix()),
+    )
 
-    # Bind tools to the model
-    model_with_tools = model.bind_tools(AVAILABLE_TOOLS)
-    response = model_with_tools.invoke(messages)
+    response = get_model_with_tools().invoke(messages)
 
     # Return the response
     return {"messages": [response]}
 
 
-def get_graph():
+def get_graph() -> CompiledStateGraph:
     """Get or create the graph instance.
 
-    Graph is rebuilt on every call to ensure tool changes are picked up.
-    This may add slight latency but ensures correctness during development.
+    The compiled graph is cached per set of tools, so repeated calls return the
+    same instance. Use `invalidate_graph_cache()` to force a rebuild.
+
+    Returns:
+        CompiledStateGraph: Compiled agent graph
     """
-    # Create the graph fresh every time
+    cache_key = tuple(id(t) for t in AVAILABLE_TOOLS)
+    graph = _GRAPH_CACHE.get(cache_key)
+    if graph is not None:
+        return graph
+
+    from langgraph.prebuilt import ToolNode
+
     workflow = StateGraph(AgentState)
 
     # Add nodes
@@ -125,5 +163,14 @@ def get_graph():
 
     # Compile the graph
     graph = workflow.compile()
+    _GRAPH_CACHE[cache_key] = graph
 
     return graph
+
+
+def invalidate_graph_cache() -> None:
+    """Drop all cached graph instances so the next `get_graph()` rebuilds.
+
+    Useful during development when tools are reloaded.
+    """
+    _GRAPH_CACHE.clear()
@@ -1,13 +1,24 @@
 """Model configuration for Azure OpenAI integration."""
 
+import functools
 import os
+from typing import TYPE_CHECKING, Union
 
 import httpx
-from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
+
+from lib._env import ensure_loaded
+
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
 # Load environment variables
-load_dotenv()
+ensure_loaded()
+
+
+# Connection pool shared by all requests made through a client, so concurrent
+# model calls reuse keep-alive connections instead of new TLS handshakes
+_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
 
 
 # Create HTTP clients with SSL verification disabled for unverified certificates
@@ -20,7 +31,9 @@ def _create_http_client(verify_ssl: bool = True) -> httpx.Client:
     Returns:
         httpx.Client: Configured HTTP client
     """
-    return httpx.Client(verify=verify_ssl)
+    return httpx.Client(
+        verify=verify_ssl, http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT
+    )
 
 
 def _create_async_http_client(verify_ssl: bool = True) -> httpx.AsyncClient:
@@ -32,10 +45,12 @@ def _create_async_http_client(verify_ssl: bool = True) -> httpx.AsyncClient:
     Returns:
         httpx.AsyncClient: Configured async HTTP client
     """
-    return httpx.AsyncClient(verify=verify_ssl)
+    return httpx.AsyncClient(
+        verify=verify_ssl, http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT
+    )
 
 
-def create_azure_model(verify_ssl: bool = True, **kwargs) -> AzureChatOpenAI:
+def create_azure_model(verify_ssl: bool = True, **kwargs) -> "AzureChatOpenAI":
     """Create an Azure OpenAI model instance.
 
     Args:
@@ -45,6 +60,8 @@ def create_azure_model(verify_ssl: bool = True, **kwargs) -> AzureChatOpenAI:
     Returns:
         AzureChatOpenAI: Configured Azure OpenAI model
     """
+    from langchain_openai import AzureChatOpenAI
+
     return AzureChatOpenAI(
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
@@ -53,11 +70,12 @@ def create_azure_model(verify_ssl: bool = True, **kwargs) -> AzureChatOpenAI:
         # temperature=0.5,
         streaming=True,
         http_client=_create_http_client(verify_ssl=verify_ssl),
+        http_async_client=_create_async_http_client(verify_ssl=verify_ssl),
         **kwargs,
     )
 
 
-def create_openai_model(verify_ssl: bool = True, **kwargs) -> ChatOpenAI:
+def create_openai_model(verify_ssl: bool = True, **kwargs) -> "ChatOpenAI":
     """Create an OpenAI model instance with optional SSL verification.
 
     Args:
@@ -67,6 +85,8 @@ def create_openai_model(verify_ssl: bool = True, **kwargs) -> ChatOpenAI:
     Returns:
         ChatOpenAI: Configured OpenAI model
     """
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(
         base_url=os.getenv("AZURE_OPENAI_ENDPOINT", ""),
         model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", ""),
@@ -74,13 +94,22 @@ def create_openai_model(verify_ssl: bool = True, **kwargs) -> ChatOpenAI:
         # temperature=0.5,
         streaming=True,
         http_client=_create_http_client(verify_ssl=verify_ssl),
+        http_async_client=_create_async_http_client(verify_ssl=verify_ssl),
         **kwargs,
     )
 
 
-# Default model instance
-# To connect to unverified SSL certificates, set VERIFY_SSL=false in environment
-verify_ssl = os.getenv("VERIFY_SSL", "true").lower() == "true"
-model = create_azure_model(verify_ssl=verify_ssl)
-if os.getenv("USE_OPENAI_CLIENT", "false").lower() == "true":
-    model = create_openai_model(verify_ssl=verify_ssl)
+@functools.lru_cache(maxsize=1)
+def get_model() -> Union["AzureChatOpenAI", "ChatOpenAI"]:
+    """Get the default model instance, creating it on first use.
+
+    To connect to unverified SSL certificates, set VERIFY_SSL=false in environment.
+    Set USE_OPENAI_CLIENT=true to use the OpenAI client instead of Azure.
+
+    Returns:
+        Union[AzureChatOpenAI, ChatOpenAI]: Configured chat model
+    """
+    verify_ssl = os.getenv("VERIFY_SSL", "true").lower() == "true"
+    if os.getenv("USE_OPENAI_CLIENT", "false").lower() == "true":
+        return create_openai_model(verify_ssl=verify_ssl)
+    return create_azure_model(verify_ssl=verify_ssl)
@@ -22,20 +22,88 @@ Environment Variables Required:
 - AZURE_OPENAI_EMBEDDING_MODEL: Embedding model name (optional, defaults to 'text-embedding-ada-002')
 """
 
+import asyncio
 import base64
+import functools
+import logging
 import os
-import uuid
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from typing import Final, List, Optional, Tuple
 
 import requests
-from azure.storage.blob import BlobServiceClient, ContentSettings
-from dotenv import load_dotenv
-from langchain_core.tools import tool
-from openai import AzureOpenAI
+import uuid_utils
+from azure.storage.blob import BlobClient, BlobServiceClient, ContentSettings
+from langchain_core.tools import BaseTool, StructuredTool, tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from openai import AsyncAzureOpenAI, AzureOpenAI
 from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+
+from lib._env import ensure_loaded
 
 # Load environment variables from .env file if present
-load_dotenv()
+ensure_loaded()
+
+logger = logging.getLogger(__name__)
+
+# Environment configuration, read once at import
+AZURE_OPENAI_ENDPOINT: Final[str] = os.getenv("AZURE_OPENAI_ENDPOINT", "")
+AZURE_OPENAI_API_KEY: Final[Optional[str]] = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_API_VERSION: Final[str] = os.getenv(
+    "AZURE_OPENAI_API_VERSION", "2025-01-01-preview"
+)
+AZURE_OPENAI_DALLE_DEPLOYMENT_NAME: Final[str] = os.getenv(
+    "AZURE_OPENAI_DALLE_DEPLOYMENT_NAME", "dall-e-3"
+)
+AZURE_STORAGE_CONNECTION_STRING: Final[str] = os.getenv(
+    "AZURE_STORAGE_CONNECTION_STRING", ""
+)
+AZURE_STORAGE_CONTAINER_NAME: Final[str] = os.getenv(
+    "AZURE_STORAGE_CONTAINER_NAME", ""
+)
+
+# The image model is FLUX when the deployment name says so, DALL-E otherwise
+IS_FLUX: Final[bool] = "flux" in AZURE_OPENAI_DALLE_DEPLOYMENT_NAME.lower()
+
+# FLUX is served from the AI Foundry endpoint of the same resource, e.g.
+# https://foundry-poc-chatbot.openai.azure.com -> https://foundry-poc-chatbot.services.ai.azure.com
+_FLUX_ENDPOINT = AZURE_OPENAI_ENDPOINT.replace(
+    ".openai.azure.com", ".services.ai.azure.com"
+).rstrip("/")
+# FLUX model names are lowercased with dashes, e.g. "FLUX.2-PRO" -> "flux-2-pro"
+_FLUX_MODEL_SLUG = AZURE_OPENAI_DALLE_DEPLOYMENT_NAME.replace(".", "-").lower()
+FLUX_URL: Final[str] = (
+    f"{_FLUX_ENDPOINT}/providers/blackforestlabs/v1/{_FLUX_MODEL_SLUG}"
+    "?api-version=preview"
+)
+_FLUX_MODEL: Final[str] = AZURE_OPENAI_DALLE_DEPLOYMENT_NAME.lower()
+_FLUX_HEADERS: Final[dict] = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {AZURE_OPENAI_API_KEY}",
+}
+
+# Variables generate_image needs, validated once; reported when the tool is used
+_IMAGE_REQUIRED_ENV = {
+    "AZURE_STORAGE_CONNECTION_STRING": AZURE_STORAGE_CONNECTION_STRING,
+    "AZURE_STORAGE_CONTAINER_NAME": AZURE_STORAGE_CONTAINER_NAME,
+}
+if IS_FLUX:
+    _IMAGE_REQUIRED_ENV["AZURE_OPENAI_ENDPOINT"] = AZURE_OPENAI_ENDPOINT
+    _IMAGE_REQUIRED_ENV["AZURE_OPENAI_API_KEY"] = AZURE_OPENAI_API_KEY or ""
+_MISSING_IMAGE_ENV: Final[List[str]] = [
+    name for name, value in _IMAGE_REQUIRED_ENV.items() if not value
+]
+
+
+# Seconds to reuse the URL generated for an identical image request; 0 disables
+IMAGE_CACHE_TTL: Final[float] = float(os.getenv("IMAGE_CACHE_TTL", "3600"))
+_IMAGE_CACHE_SIZE = 1024
+# (normalized prompt, size, style) -> (image URL, expiry on the monotonic clock)
+_image_cache: "OrderedDict[Tuple[str, str, str], Tuple[str, float]]" = OrderedDict()
+_image_cache_lock = threading.Lock()
 
 
 # Pydantic models for tool arguments
@@ -57,24 +125,52 @@ class AzureSearchFilterInput(BaseModel):
     )
 
 
-tool_generator = []
+tool_generator: List[BaseTool] = []
 
 
 # Initialize Azure OpenAI client for DALL-E
-def get_dalle_client():
+@functools.lru_cache(maxsize=1)
+def get_dalle_client() -> AzureOpenAI:
+    """Get the shared Azure OpenAI client used for DALL-E image generation."""
     return AzureOpenAI(
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT", ""),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_key=AZURE_OPENAI_API_KEY,
     )
 
 
-def get_blob_service_client():
-    return BlobServiceClient.from_connection_string(
-        os.getenv("AZURE_STORAGE_CONNECTION_STRING", "")
+@functools.lru_cache(maxsize=1)
+def get_async_dalle_client() -> AsyncAzureOpenAI:
+    """Get the shared async Azure OpenAI client used for DALL-E image generation."""
+    return AsyncAzureOpenAI(
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_key=AZURE_OPENAI_API_KEY,
     )
 
 
+@functools.lru_cache(maxsize=1)
+def get_flux_session() -> requests.Session:
+    """Get the shared HTTP session used for FLUX calls.
+
+    Keeps connections to the FLUX endpoint alive between image generations so
+    only the first call pays for the TCP and TLS handshake.
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+
+@functools.lru_cache(maxsize=1)
+def get_blob_service_client() -> BlobServiceClient:
+    """Get the shared Blob Storage client used to store generated images."""
+    return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+
+
+# (epoch second, ISO string) of the last get_current_time result
+_current_time_cache: Optional[Tuple[int, str]] = None
+
+
 @tool
 def get_current_time() -> str:
     """Get the current date and time.
@@ -82,7 +178,11 @@ def get_current_time() -> str:
     Returns:
         str: Current date and time in ISO format
     """
-    return datetime.now().isoformat()
+    global _current_time_cache
+    second = int(time.time())
+    if _current_time_cache is None or _current_time_cache[0] != second:
+        _current_time_cache = (second, datetime.fromtimestamp(second).isoformat())
+    return _current_time_cache[1]
 
 
 tool_generator.append(get_current_time)
@@ -99,74 +199,210 @@ def _generate_image_flux(prompt: str, size: str) -> bytes:
     Returns:
         bytes: Generated image bytes
     """
-    # Get base endpoint and derive FLUX endpoint
-    openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    api_key = os.getenv("AZURE_OPENAI_API_KEY")
-    deployment_name = os.getenv("AZURE_OPENAI_DALLE_DEPLOYMENT_NAME", "flux.2-pro")
-
-    if not openai_endpoint:
-        raise EnvironmentError("AZURE_OPENAI_ENDPOINT environment variable is not set")
-    if not api_key:
+    payload = {"prompt": prompt, "size": size, "n": 1, "model": _FLUX_MODEL}
+
+    logger.debug("Calling FLUX API: %s", FLUX_URL)
+    response = get_flux_session().post(
+        FLUX_URL, headers=_FLUX_HEADERS, json=payload, timeout=120
+    )
+    response.raise_for_status()
+
+    # Drop the raw response body and the parsed payload before decoding so
+    # only the base64 string and the decoded image are alive at once
+    b64_data = response.json()["data"][0]["b64_json"]
+    del response
+    return base64.b64decode(b64_data)
+
+
+def _dalle_request(prompt: str, size: str, style: str) -> dict:
+    """Build the DALL-E images.generate arguments shared by sync and async calls."""
+    return {
+        "model": AZURE_OPENAI_DALLE_DEPLOYMENT_NAME,
+        "prompt": prompt,
+        "size": size,
+        "quality": "standard",
+        "style": style,
+        "n": 1,
+        # A URL lets Blob Storage copy the image server-side instead of
+        # shipping it through this process as base64
+        "response_format": "url",
+    }
+
+
+def _generate_image_dalle(prompt: str, size: str, style: str) -> str:
+    """Generate an image using DALL-E model.
+
+    Args:
+        prompt: Prompt for image generation
+        size: Size of the generated image
+        style: Style of the generated image
+
+    Returns:
+        str: Temporary URL of the generated image
+    """
+    result = get_dalle_client().images.generate(**_dalle_request(prompt, size, style))
+    return result.data[0].url
+
+
+async def _agenerate_image_dalle(prompt: str, size: str, style: str) -> str:
+    """Async variant of `_generate_image_dalle`."""
+    result = await get_async_dalle_client().images.generate(
+        **_dalle_request(prompt, size, style)
+    )
+    return result.data[0].url
+
+
+def _check_image_env() -> None:
+    """Raise if any environment variable generate_image needs is missing."""
+    if _MISSING_IMAGE_ENV:
         raise EnvironmentError(
-            "AZURE_OPENAI_API_KEY environment variable is not set for FLUX model"
+            "Missing required environment variables: " + ", ".join(_MISSING_IMAGE_ENV)
         )
 
-    # Transform endpoint from openai.azure.com to services.ai.azure.com
-    # e.g., https://foundry-poc-chatbot.openai.azure.com -> https://foundry-poc-chatbot.services.ai.azure.com
-    flux_endpoint = openai_endpoint.replace(
-        ".openai.azure.com", ".services.ai.azure.com"
+
+def _new_image_blob_client() -> BlobClient:
+    """Get a client for a new, uniquely named image blob."""
+    # uuid7 is time-ordered, so image blobs list in creation order
+    blob_name = f"images/{uuid_utils.uuid7()}.png"
+    return get_blob_service_client().get_blob_client(
+        container=AZURE_STORAGE_CONTAINER_NAME, blob=blob_name
     )
 
-    # Transform flux endpoint model name to match FLUX naming convention
-    # e.g. "FLUX.2-PRO" -> "flux-2-pro"
-    endpoint_model_name = deployment_name.replace(".", "-").lower()
 
-    # Build the full URL with the model path
-    url = f"{flux_endpoint.rstrip('/')}/providers/blackforestlabs/v1/{endpoint_model_name}?api-version=preview"
+def _upload_image(image_bytes: bytes) -> str:
+    """Upload a generated PNG to Blob Storage.
 
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    Args:
+        image_bytes: PNG image bytes
 
-    payload = {"prompt": prompt, "size": size, "n": 1, "model": deployment_name.lower()}
+    Returns:
+        str: Public URL of the uploaded blob
+    """
+    logger.debug("Image generated (size: %d bytes)", len(image_bytes))
+
+    # Upload with public content type
+    blob_client = _new_image_blob_client()
+    blob_client.upload_blob(
+        image_bytes,
+        length=len(image_bytes),
+        overwrite=True,
+        content_settings=ContentSettings(content_type="image/png"),
+    )
+    logger.debug("Image uploaded to blob: %s", blob_client.blob_name)
 
-    print(f"  🌐 Calling FLUX API: {url}")
-    response = requests.post(url, headers=headers, json=payload, timeout=120)
-    response.raise_for_status()
+    # Return the public URL
+    image_url = blob_client.url
+    logger.debug("Image URL: %s", image_url)
+    return image_url
 
-    result = response.json()
-    b64_data = result["data"][0]["b64_json"]
-    return base64.b64decode(b64_data)
 
+def _copy_image_from_url(source_url: str) -> str:
+    """Copy a generated PNG into Blob Storage straight from its source URL.
 
-def _generate_image_dalle(prompt: str, size: str, style: str) -> bytes:
-    """Generate an image using DALL-E model.
+    Uses a single server-side Put Blob From URL that also sets the content
+    type, so the image bytes never pass through this process.
 
     Args:
-        prompt: Prompt for image generation
-        size: Size of the generated image
-        style: Style of the generated image
+        source_url: Publicly readable URL of the generated image
 
     Returns:
-        bytes: Generated image bytes
+        str: Public URL of the copied blob
     """
-    client = get_dalle_client()
-    deployment_name = os.getenv("AZURE_OPENAI_DALLE_DEPLOYMENT_NAME", "dall-e-3")
-
-    result = client.images.generate(
-        model=deployment_name,
-        prompt=prompt,
-        size=size,
-        quality="standard",
-        style=style,
-        n=1,
-        response_format="b64_json",
+    blob_client = _new_image_blob_client()
+    blob_client.upload_blob_from_url(
+        source_url,
+        overwrite=True,
+        content_settings=ContentSettings(content_type="image/png"),
     )
+    logger.debug("Image copied to blob: %s", blob_client.blob_name)
 
-    b64_data = result.data[0].b64_json
-    return base64.b64decode(b64_data)
+    # Return the public URL
+    image_url = blob_client.url
+    logger.debug("Image URL: %s", image_url)
+    return image_url
 
 
-@tool
-def generate_image(prompt: str, size: str, style: str) -> str:
+def _image_cache_key(prompt: str, size: str, style: str) -> Tuple[str, str, str]:
+    """Build the cache key of an image request.
+
+    Prompts differing only in case or whitespace share a key, and style is
+    ignored for FLUX, which does not use it.
+    """
+    return " ".join(prompt.lower().split()), size, "" if IS_FLUX else style
+
+
+def _get_cached_image(key: Tuple[str, str, str]) -> Optional[str]:
+    """Get the URL of a still-fresh image generated for the same request."""
+    with _image_cache_lock:
+        cached = _image_cache.get(key)
+        if cached is None or time.monotonic() >= cached[1]:
+            return None
+        _image_cache.move_to_end(key)
+        return cached[0]
+
+
+def _cache_image(key: Optional[Tuple[str, str, str]], image_url: str) -> str:
+    """Remember the URL generated for an image request and return it.
+
+    Nothing is stored when `key` is None, i.e. the request bypasses the cache.
+    """
+    if key is not None and IMAGE_CACHE_TTL > 0:
+        with _image_cache_lock:
+            _image_cache[key] = (image_url, time.monotonic() + IMAGE_CACHE_TTL)
+            _image_cache.move_to_end(key)
+            if len(_image_cache) > _IMAGE_CACHE_SIZE:
+                _image_cache.popitem(last=False)
+    return image_url
+
+
+def _start_image_request(
+    prompt: str, size: str, style: str, no_cache: bool
+) -> Tuple[Optional[Tuple[str, str, str]], Optional[str]]:
+    """Run the checks shared by the sync and async image tools.
+
+    Validates the environment, logs the request and looks up the image cache.
+    The cache is bypassed when the caller asks for a fresh image and for
+    DALL-E styles other than 'natural', whose output varies more between
+    generations; FLUX ignores style, so its requests are always cacheable.
+
+    Returns:
+        Tuple of the cache key (None when caching is bypassed) and the cached
+        image URL, if any
+    """
+    _check_image_env()
+
+    logger.info(
+        "Image generation: prompt=%r, model=%s",
+        prompt,
+        "FLUX" if IS_FLUX else "DALL-E",
+    )
+
+    if no_cache or (not IS_FLUX and style != "natural"):
+        return None, None
+
+    # Identical requests reuse the image generated earlier
+    cache_key = _image_cache_key(prompt, size, style)
+    cached_url = _get_cached_image(cache_key)
+    if cached_url is not None:
+        logger.debug("Reusing cached image: %s", cached_url)
+    return cache_key, cached_url
+
+
+def _image_error(e: Exception) -> str:
+    """Report a failed image generation and build the tool's error message.
+
+    Must be called from an except block so the traceback is logged.
+    """
+    if isinstance(e, EnvironmentError):
+        prefix = "Environment error"
+    else:
+        prefix = "Error generating image"
+    error_msg = f"{prefix}: {str(e)}"
+    logger.exception(error_msg)
+    return error_msg
+
+
+def _generate_image(prompt: str, size: str, style: str, no_cache: bool = False) -> str:
     """Generate an image using DALL-E or FLUX model.
 
     The model is automatically selected based on the AZURE_OPENAI_DALLE_DEPLOYMENT_NAME
@@ -176,75 +412,57 @@ def generate_image(prompt: str, size: str, style: str) -> str:
         prompt: Prompt for image generation
         size: Size of the generated image. Pick one: ['1024x1024', '1792x1024', '1024x1792']
         style: Style of the generated image. Pick one: ['vivid', 'natural'] (only used for DALL-E)
+        no_cache: Set to true to generate a new image even if the same request was made recently
 
     Returns:
         str: Generated image URL
     """
     try:
-        # Validate environment variables
-        storage_connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
-
-        if not storage_connection_string:
-            raise EnvironmentError(
-                "AZURE_STORAGE_CONNECTION_STRING environment variable is not set"
-            )
-        if not container_name:
-            raise EnvironmentError(
-                "AZURE_STORAGE_CONTAINER_NAME environment variable is not set"
-            )
-
-        deployment_name = os.getenv("AZURE_OPENAI_DALLE_DEPLOYMENT_NAME", "dall-e-3")
-        is_flux = "flux" in deployment_name.lower()
-
-        print(
-            f"🔍 Image generation: prompt='{prompt}', model={'FLUX' if is_flux else 'DALL-E'}"
-        )
+        cache_key, cached_url = _start_image_request(prompt, size, style, no_cache)
+        if cached_url is not None:
+            return cached_url
 
         # Generate image based on model type
-        if is_flux:
-            image_bytes = _generate_image_flux(prompt, size)
+        if IS_FLUX:
+            image_url = _upload_image(_generate_image_flux(prompt, size))
         else:
-            image_bytes = _generate_image_dalle(prompt, size, style)
-
-        print(f"  ✅ Image generated (size: {len(image_bytes)} bytes)")
-
-        # Upload to Blob Storage
-        blob_service = get_blob_service_client()
-        blob_name = f"images/{uuid.uuid4()}.png"
+            image_url = _copy_image_from_url(_generate_image_dalle(prompt, size, style))
+        return _cache_image(cache_key, image_url)
+    except Exception as e:
+        return _image_error(e)
 
-        # Get blob client and upload with public content type
-        blob_client = blob_service.get_blob_client(
-            container=container_name, blob=blob_name
-        )
-        blob_client.upload_blob(
-            image_bytes,
-            overwrite=True,
-            content_settings=ContentSettings(content_type="image/png"),
-        )
-        print(f"  ✅ Image uploaded to blob: {blob_name}")
 
-        # Return the public URL
-        image_url = blob_client.url
-        print(f"  ✅ Image URL: {image_url}")
-        return image_url
+async def _agenerate_image(
+    prompt: str, size: str, style: str, no_cache: bool = False
+) -> str:
+    """Async variant of `_generate_image`.
 
-    except EnvironmentError as e:
-        error_msg = f"Environment error: {str(e)}"
-        print(f"  ❌ {error_msg}")
-        import traceback
+    DALL-E is awaited on the async client; the FLUX call and the blob upload
+    use sync SDKs and run in worker threads, so several image tool calls in
+    one agent step proceed concurrently without blocking the event loop.
+    """
+    try:
+        cache_key, cached_url = _start_image_request(prompt, size, style, no_cache)
+        if cached_url is not None:
+            return cached_url
 
-        print(traceback.format_exc())
-        return error_msg
+        # Generate image based on model type
+        if IS_FLUX:
+            image_bytes = await asyncio.to_thread(_generate_image_flux, prompt, size)
+            image_url = await asyncio.to_thread(_upload_image, image_bytes)
+        else:
+            source_url = await _agenerate_image_dalle(prompt, size, style)
+            image_url = await asyncio.to_thread(_copy_image_from_url, source_url)
+        return _cache_image(cache_key, image_url)
     except Exception as e:
-        error_msg = f"Error generating image: {str(e)}"
-        print(f"  ❌ {error_msg}")
-        import traceback
-
-        print(traceback.format_exc())
-        return error_msg
+        return _image_error(e)
 
 
+generate_image = StructuredTool.from_function(
+    func=_generate_image,
+    coroutine=_agenerate_image,
+    name="generate_image",
+)
 tool_generator.append(generate_image)
 
 
@@ -264,6 +482,24 @@ def weather(city: str) -> str:
 
 tool_generator.append(weather)
 
-print(f"✓ Tools loaded. Tools available: {[tool.name for tool in tool_generator]}")
-# List of available tools
-AVAILABLE_TOOLS = tool_generator
+# Available tools, frozen once registration is done
+AVAILABLE_TOOLS: Final[Tuple[BaseTool, ...]] = tuple(tool_generator)
+del tool_generator
+
+# OpenAI function-calling schemas for AVAILABLE_TOOLS, converted once
+TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in AVAILABLE_TOOLS]
+
+
+def log_registered_tools(log: logging.Logger) -> None:
+    """Log the names of the tools available to the agent.
+
+    Called from application startup rather than at import so each worker
+    logs it once, when it actually starts serving.
+
+    Args:
+        log: Logger to write to
+    """
+    if log.isEnabledFor(logging.INFO):
+        log.info(
+            "Tools loaded. Tools available: %s", [t.name for t in AVAILABLE_TOOLS]
+        )
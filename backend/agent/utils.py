@@ -1,7 +1,11 @@
 """LangGraph utility functions for message processing."""
 
+import logging
 import re
-from typing import List
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Type
 
 from langchain_core.messages import (
     AIMessage,
@@ -10,9 +14,35 @@ from langchain_core.messages import (
     SystemMessage,
     ToolMessage,
 )
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph.message import Messages, add_messages
 
 from lib.blob import get_file_temporary_link
-from lib.database import db_manager
+from lib.database import Attachment, get_db_manager
+
+logger = logging.getLogger(__name__)
+
+# Rewritten messages keyed by message id, holding (source message, rewritten
+# message, expiry). Entries only match the exact source object, so edited
+# messages are reprocessed. Embedded SAS links are requested with a 1-hour
+# expiry, which get_file_temporary_link guarantees is still left even for a
+# reused link, so entries expire before the links they hold.
+_PROCESSED_MESSAGE_TTL = 3000
+_PROCESSED_MESSAGE_CACHE_SIZE = 512
+_processed_message_cache: "OrderedDict[str, Tuple[BaseMessage, BaseMessage, float]]" = (
+    OrderedDict()
+)
+# Graph runs call the model node from executor threads concurrently
+_processed_message_cache_lock = threading.Lock()
+
+# chatbot://{attachment_id} with optional surrounding whitespace and trailing slashes
+_CHATBOT_URL_RE = re.compile(r"chatbot://\s*([^/\s]+)/*\s*$")
+
+# Approximate token counts keyed by (message id, content fingerprint), kept
+# off the messages so copies with new content are never credited a stale count
+_TOKEN_COUNT_CACHE_SIZE = 4096
+_token_count_cache: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+_token_count_cache_lock = threading.Lock()
 
 
 def change_file_to_url(messages: List[BaseMessage]) -> List[BaseMessage]:
@@ -21,6 +51,9 @@ def change_file_to_url(messages: List[BaseMessage]) -> List[BaseMessage]:
 
     This function inspects all messages and looks for image_url content with chatbot:// URLs,
     then replaces them with temporary blob URLs (valid for 1 hour) before sending to AI.
+    Rewritten messages are cached per message object, so repeated model calls within a
+    run only process messages that are new since the previous call. Attachments for all
+    new messages are fetched with a single database query.
 
     Args:
         messages: List of BaseMessage objects that may contain chatbot:// URLs
@@ -28,14 +61,46 @@ def change_file_to_url(messages: List[BaseMessage]) -> List[BaseMessage]:
     Returns:
         List[BaseMessage]: Messages with chatbot:// URLs replaced by blob URLs with SAS tokens
     """
-    processed_messages = []
+    processed_messages: List[Optional[BaseMessage]] = []
+    pending: List[BaseMessage] = []
+    now = time.monotonic()
+
+    with _processed_message_cache_lock:
+        for message in messages:
+            # Reuse the rewrite of a message object already processed this run
+            cached = _processed_message_cache.get(message.id) if message.id else None
+            if cached is not None and cached[0] is message and now < cached[2]:
+                _processed_message_cache.move_to_end(message.id)
+                processed_messages.append(cached[1])
+            else:
+                processed_messages.append(None)
+                pending.append(message)
+
+    if not pending:
+        return processed_messages
+
+    # Most turns carry no chatbot:// images; then there is nothing to rewrite
+    file_ids = extract_file_ids_from_messages(pending)
+    if not file_ids:
+        return [
+            message if processed is None else processed
+            for message, processed in zip(messages, processed_messages)
+        ]
+
+    # Look up every attachment referenced by the new messages in one query
+    attachments_by_id = get_db_manager().get_attachments_by_ids(sorted(set(file_ids)))
+
+    pending_iter = iter(pending)
+    for index, processed in enumerate(processed_messages):
+        if processed is not None:
+            continue
+        message = next(pending_iter)
 
-    for message in messages:
         # Create a copy of the message to avoid modifying the original
         if isinstance(message, HumanMessage):
-            processed_message = process_human_message(message)
+            processed_message = process_human_message(message, attachments_by_id)
         elif isinstance(message, AIMessage):
-            processed_message = process_ai_message(message)
+            processed_message = process_ai_message(message, attachments_by_id)
         elif isinstance(message, SystemMessage):
             # System messages typically don't have images
             processed_message = message
@@ -43,26 +108,36 @@ def change_file_to_url(messages: List[BaseMessage]) -> List[BaseMessage]:
             # For other message types, keep as is
             processed_message = message
 
-        processed_messages.append(processed_message)
+        if processed_message is not message and message.id:
+            with _processed_message_cache_lock:
+                _processed_message_cache[message.id] = (
+                    message,
+                    processed_message,
+                    now + _PROCESSED_MESSAGE_TTL,
+                )
+                _processed_message_cache.move_to_end(message.id)
+                if len(_processed_message_cache) > _PROCESSED_MESSAGE_CACHE_SIZE:
+                    _processed_message_cache.popitem(last=False)
+
+        processed_messages[index] = processed_message
 
     return processed_messages
 
 
-def process_human_message(message: HumanMessage) -> HumanMessage:
+def process_human_message(
+    message: HumanMessage, attachments_by_id: Optional[Dict[str, Attachment]] = None
+) -> HumanMessage:
     """
     Process HumanMessage to convert chatbot:// URLs to blob URLs.
 
     Args:
         message: HumanMessage that may contain chatbot:// URLs
+        attachments_by_id: Prefetched attachments; looked up one by one if omitted
 
     Returns:
         HumanMessage: Message with converted URLs
     """
-    # Check if message has content attribute
-    if not hasattr(message, "content"):
-        return message
-
-    content = message.content
+    content = getattr(message, "content", None)
 
     # If content is a string, no images to process
     if isinstance(content, str):
@@ -71,12 +146,14 @@ def process_human_message(message: HumanMessage) -> HumanMessage:
     # If content is a list (multimodal content)
     if isinstance(content, list):
         new_content = []
+        changed = False
 
         for item in content:
             if isinstance(item, dict):
                 # Check if this is an image_url type
                 if item.get("type") == "image_url":
-                    new_item = process_image_url_item(item)
+                    new_item = process_image_url_item(item, attachments_by_id)
+                    changed = changed or new_item is not item
                     new_content.append(new_item)
                 else:
                     # Keep other content types as is (text, etc.)
@@ -84,19 +161,23 @@ def process_human_message(message: HumanMessage) -> HumanMessage:
             else:
                 new_content.append(item)
 
+        # Nothing was rewritten, keep the original message
+        if not changed:
+            return message
+
         # Create new HumanMessage with updated content
         return HumanMessage(
             content=new_content,
-            additional_kwargs=message.additional_kwargs
-            if hasattr(message, "additional_kwargs")
-            else {},
-            id=message.id if hasattr(message, "id") else None,
+            additional_kwargs=getattr(message, "additional_kwargs", {}),
+            id=getattr(message, "id", None),
         )
 
     return message
 
 
-def process_ai_message(message: AIMessage) -> AIMessage:
+def process_ai_message(
+    message: AIMessage, attachments_by_id: Optional[Dict[str, Attachment]] = None
+) -> AIMessage:
     """
     Process AIMessage to convert chatbot:// URLs to blob URLs.
 
@@ -105,15 +186,12 @@ def process_ai_message(message: AIMessage) -> AIMessage:
 
     Args:
         message: AIMessage that may contain chatbot:// URLs
+        attachments_by_id: Prefetched attachments; looked up one by one if omitted
 
     Returns:
         AIMessage: Message with converted URLs
     """
-    # Check if message has content attribute
-    if not hasattr(message, "content"):
-        return message
-
-    content = message.content
+    content = getattr(message, "content", None)
 
     # If content is a string, no images to process
     if isinstance(content, str):
@@ -122,31 +200,37 @@ def process_ai_message(message: AIMessage) -> AIMessage:
     # If content is a list (multimodal content)
     if isinstance(content, list):
         new_content = []
+        changed = False
 
         for item in content:
             if isinstance(item, dict):
                 # Check if this is an image_url type
                 if item.get("type") == "image_url":
-                    new_item = process_image_url_item(item)
+                    new_item = process_image_url_item(item, attachments_by_id)
+                    changed = changed or new_item is not item
                     new_content.append(new_item)
                 else:
                     new_content.append(item)
             else:
                 new_content.append(item)
 
+        # Nothing was rewritten, keep the original message
+        if not changed:
+            return message
+
         # Create new AIMessage with updated content
         return AIMessage(
             content=new_content,
-            additional_kwargs=message.additional_kwargs
-            if hasattr(message, "additional_kwargs")
-            else {},
-            id=message.id if hasattr(message, "id") else None,
+            additional_kwargs=getattr(message, "additional_kwargs", {}),
+            id=getattr(message, "id", None),
         )
 
     return message
 
 
-def process_image_url_item(item: dict) -> dict:
+def process_image_url_item(
+    item: dict, attachments_by_id: Optional[Dict[str, Attachment]] = None
+) -> dict:
     """
     Process a single image_url content item to convert chatbot:// URL to blob URL.
 
@@ -168,6 +252,7 @@ def process_image_url_item(item: dict) -> dict:
 
     Args:
         item: Dictionary containing image_url content
+        attachments_by_id: Prefetched attachments; looked up in the database if omitted
 
     Returns:
         dict: Updated item with blob URL
@@ -177,22 +262,16 @@ def process_image_url_item(item: dict) -> dict:
         image_url_obj = item.get("image_url", {})
         url = image_url_obj.get("url", "")
 
-        # Check if it's a chatbot:// URL
-        if url.startswith("chatbot://"):
-            # Extract attachment ID and sanitize it
-            attachment_id = url.replace("chatbot://", "")
-            # Remove trailing slashes and whitespace
-            attachment_id = attachment_id.rstrip("/").strip()
-
-            if not attachment_id:
-                # Empty ID after sanitization
-                print(
-                    f"Warning: Empty attachment ID after sanitization from URL: {url}"
+        # Check if it's a chatbot:// URL and extract the sanitized ID
+        attachment_id = _parse_attachment_id(url)
+        if attachment_id is not None:
+            # Get attachment from the prefetched batch or the database; the
+            # owner is unknown here, so the lookup goes through the ID query
+            if attachments_by_id is None:
+                attachments_by_id = get_db_manager().get_attachments_by_ids(
+                    [attachment_id]
                 )
-                return item
-
-            # Get attachment from database
-            attachment = db_manager.get_attachment(attachment_id)
+            attachment = attachments_by_id.get(attachment_id)
 
             if attachment:
                 # Get temporary blob URL with SAS token (valid for 1 hour)
@@ -209,18 +288,31 @@ def process_image_url_item(item: dict) -> dict:
                 }
             else:
                 # Attachment not found, log warning and return original
-                print(f"Warning: Attachment not found for ID: {attachment_id}")
+                logger.warning("Attachment not found for ID: %s", attachment_id)
                 return item
+        elif url.startswith("chatbot://"):
+            # Empty or malformed ID after sanitization
+            logger.warning("Invalid attachment ID after sanitization from URL: %s", url)
+            return item
         else:
             # Not a chatbot:// URL, return as is (might be http/https URL)
             return item
 
     except Exception as e:
         # If any error occurs, log it and return original item
-        print(f"Error processing image_url item: {e}")
+        logger.error("Error processing image_url item: %s", e)
         return item
 
 
+def _parse_attachment_id(url: str) -> Optional[str]:
+    """Extract the sanitized attachment ID from a chatbot:// URL.
+
+    Returns None when the URL is not a chatbot:// URL or carries no ID.
+    """
+    match = _CHATBOT_URL_RE.match(url)
+    return match.group(1) if match else None
+
+
 def extract_file_ids_from_messages(messages: List[BaseMessage]) -> List[str]:
     """
     Extract all chatbot:// IDs from messages.
@@ -236,17 +328,14 @@ def extract_file_ids_from_messages(messages: List[BaseMessage]) -> List[str]:
     file_ids = []
 
     for message in messages:
-        if not hasattr(message, "content"):
-            continue
-
-        content = message.content
+        content = getattr(message, "content", None)
 
         if isinstance(content, list):
             for item in content:
                 if isinstance(item, dict) and item.get("type") == "image_url":
                     url = item.get("image_url", {}).get("url", "")
-                    if url.startswith("chatbot://"):
-                        file_id = url.replace("chatbot://", "")
+                    file_id = _parse_attachment_id(url)
+                    if file_id is not None:
                         file_ids.append(file_id)
 
     return file_ids
@@ -255,96 +344,140 @@ def extract_file_ids_from_messages(messages: List[BaseMessage]) -> List[str]:
 def get_text_from_contents(contents: list[dict]) -> str:
     """Extract text from message contents."""
     if isinstance(contents, list):
-        texts = [item["text"] for item in contents if item["type"] == "text"]
-        return "\n".join(texts)
+        return "\n".join(
+            item["text"]
+            for item in contents
+            if isinstance(item, dict) and item.get("type") == "text" and "text" in item
+        )
     elif isinstance(contents, str):
         return contents
     return ""
 
 
-def sanitize_and_validate_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
-    """
-    Sanitize and validate message list to ensure proper tool call/response pairing.
+def _sanitize_messages(
+    messages: List[BaseMessage],
+) -> Tuple[List[BaseMessage], int]:
+    """Drop incomplete tool call sequences and orphaned ToolMessages in one pass.
 
-    This function:
-    1. Removes incomplete tool call sequences (AIMessage with tool_calls but no ToolMessage responses)
-    2. Ensures all tool calls have corresponding tool responses
-    3. Maintains message order and conversation flow
-    4. Removes orphaned ToolMessages (tool responses without preceding tool calls)
+    Also tracks where the last complete conversation turn ends, so callers
+    can trim to it without another traversal.
 
     Args:
         messages: List of BaseMessage objects from the conversation state
 
     Returns:
-        List[BaseMessage]: Sanitized list of messages safe for OpenAI API
+        Tuple[List[BaseMessage], int]: Sanitized messages and the length of
+            their prefix ending on a complete turn
     """
-    if not messages:
-        return messages
-
-    sanitized_messages = []
+    sanitized_messages: List[BaseMessage] = []
+    # Length of the sanitized prefix that ends on a complete conversation turn
+    complete_length = 0
     i = 0
 
     while i < len(messages):
         current_message = messages[i]
 
+        tool_calls = getattr(current_message, "tool_calls", None)
+
         # Handle AIMessage with tool calls
-        if (
-            isinstance(current_message, AIMessage)
-            and hasattr(current_message, "tool_calls")
-            and current_message.tool_calls
-        ):
-            tool_call_ids = {tc["id"] for tc in current_message.tool_calls}
+        if isinstance(current_message, AIMessage) and tool_calls:
+            tool_call_ids = {tc["id"] for tc in tool_calls}
+            # Tool calls still waiting for a response; emptied as they arrive
+            pending = set(tool_call_ids)
 
             # Look ahead to find corresponding ToolMessages
             j = i + 1
-            found_tool_responses = set()
             tool_messages = []
 
             # Collect all consecutive ToolMessages that respond to this AIMessage
             while j < len(messages) and isinstance(messages[j], ToolMessage):
                 tool_msg = messages[j]
-                if (
-                    hasattr(tool_msg, "tool_call_id")
-                    and tool_msg.tool_call_id in tool_call_ids
-                ):
-                    found_tool_responses.add(tool_msg.tool_call_id)
+                if getattr(tool_msg, "tool_call_id", None) in tool_call_ids:
+                    pending.discard(tool_msg.tool_call_id)
                     tool_messages.append(tool_msg)
                 j += 1
 
             # Only include this AIMessage and its ToolMessages if ALL tool calls have responses
-            if found_tool_responses == tool_call_ids:
+            if not pending:
                 sanitized_messages.append(current_message)
                 sanitized_messages.extend(tool_messages)
+                complete_length = len(sanitized_messages)
                 i = j  # Skip past the tool messages we just processed
             else:
                 # Skip this incomplete tool call sequence
-                print(
-                    f"Skipping incomplete tool call sequence. Missing responses for: {tool_call_ids - found_tool_responses}"
+                logger.debug(
+                    "Skipping incomplete tool call sequence. Missing responses for: %s",
+                    pending,
                 )
                 i = j  # Skip past any partial tool messages
 
         # Handle other message types (HumanMessage, SystemMessage, AIMessage without tool calls)
         elif isinstance(current_message, (HumanMessage, SystemMessage)) or (
-            isinstance(current_message, AIMessage)
-            and (
-                not hasattr(current_message, "tool_calls")
-                or not current_message.tool_calls
-            )
+            isinstance(current_message, AIMessage) and not tool_calls
         ):
             sanitized_messages.append(current_message)
+            if not isinstance(current_message, SystemMessage):
+                complete_length = len(sanitized_messages)
             i += 1
 
         # Skip orphaned ToolMessages (shouldn't happen with proper sequencing, but safety check)
         elif isinstance(current_message, ToolMessage):
-            print(f"Skipping orphaned ToolMessage: {current_message.tool_call_id}")
+            logger.debug(
+                "Skipping orphaned ToolMessage: %s", current_message.tool_call_id
+            )
             i += 1
 
         else:
             # Unknown message type, skip
-            print(f"Skipping unknown message type: {type(current_message)}")
+            logger.debug("Skipping unknown message type: %s", type(current_message))
             i += 1
 
-    return sanitized_messages
+    return sanitized_messages, complete_length
+
+
+def sanitize_and_validate_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Sanitize and validate message list to ensure proper tool call/response pairing.
+
+    This function:
+    1. Removes incomplete tool call sequences (AIMessage with tool_calls but no ToolMessage responses)
+    2. Ensures all tool calls have corresponding tool responses
+    3. Maintains message order and conversation flow
+    4. Removes orphaned ToolMessages (tool responses without preceding tool calls)
+
+    Args:
+        messages: List of BaseMessage objects from the conversation state
+
+    Returns:
+        List[BaseMessage]: Sanitized list of messages safe for OpenAI API
+    """
+    if not messages:
+        return messages
+
+    return _sanitize_messages(messages)[0]
+
+
+def prepare_messages_for_llm(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Sanitize messages and trim them to the last complete conversation turn.
+
+    Equivalent to `get_last_complete_conversation_turn(sanitize_and_validate_messages(messages))`
+    in a single pass. The result always passes `validate_message_sequence`.
+
+    Args:
+        messages: List of BaseMessage objects from the conversation state
+
+    Returns:
+        List[BaseMessage]: Sanitized messages up to the last complete turn
+    """
+    if not messages:
+        return messages
+
+    sanitized_messages, complete_length = _sanitize_messages(messages)
+    if complete_length:
+        return sanitized_messages[:complete_length]
+    # No complete turn; keep the first message only
+    return sanitized_messages[:1]
 
 
 def validate_message_sequence(messages: List[BaseMessage]) -> bool:
@@ -360,36 +493,59 @@ def validate_message_sequence(messages: List[BaseMessage]) -> bool:
     if not messages:
         return True
 
-    for i, message in enumerate(messages):
-        if (
-            isinstance(message, AIMessage)
-            and hasattr(message, "tool_calls")
-            and message.tool_calls
-        ):
-            tool_call_ids = {tc["id"] for tc in message.tool_calls}
+    # Tool call IDs of the latest AIMessage still waiting for a ToolMessage;
+    # None outside a tool call sequence
+    pending = None
 
-            # Check that the next messages are ToolMessages responding to all tool calls
-            j = i + 1
-            found_responses = set()
+    for message in messages:
+        if isinstance(message, ToolMessage) and pending is not None:
+            pending.discard(getattr(message, "tool_call_id", None))
+            continue
 
-            while j < len(messages) and isinstance(messages[j], ToolMessage):
-                tool_msg = messages[j]
-                if (
-                    hasattr(tool_msg, "tool_call_id")
-                    and tool_msg.tool_call_id in tool_call_ids
-                ):
-                    found_responses.add(tool_msg.tool_call_id)
-                j += 1
+        if pending:
+            logger.debug("Validation failed: Missing tool responses for %s", pending)
+            return False
 
-            if found_responses != tool_call_ids:
-                print(
-                    f"Validation failed: Missing tool responses for {tool_call_ids - found_responses}"
-                )
-                return False
+        if isinstance(message, AIMessage) and getattr(message, "tool_calls", None):
+            pending = {tc["id"] for tc in message.tool_calls}
+        else:
+            pending = None
+
+    if pending:
+        logger.debug("Validation failed: Missing tool responses for %s", pending)
+        return False
 
     return True
 
 
+def _find_completed_tool_sequences(messages: List[BaseMessage]) -> List[bool]:
+    """Flag the ToolMessages by which their tool call sequence is complete.
+
+    A ToolMessage at index i is flagged when every tool call of the nearest
+    preceding AIMessage with tool calls has a response at or before i. One
+    forward pass replaces a backward search per ToolMessage.
+
+    Args:
+        messages: List of BaseMessage objects
+
+    Returns:
+        List[bool]: One flag per message
+    """
+    flags = [False] * len(messages)
+    # Tool call IDs of the current sequence still waiting for a response;
+    # None before the first AIMessage with tool calls
+    pending: Optional[set] = None
+
+    for i, message in enumerate(messages):
+        if isinstance(message, AIMessage) and getattr(message, "tool_calls", None):
+            pending = {tc["id"] for tc in message.tool_calls}
+        elif isinstance(message, ToolMessage) and pending is not None:
+            pending.discard(getattr(message, "tool_call_id", None))
+            flags[i] = not pending
+
+    return flags
+
+
 def get_last_complete_conversation_turn(
     messages: List[BaseMessage],
 ) -> List[BaseMessage]:
@@ -409,6 +565,8 @@ def get_last_complete_conversation_turn(
     if not messages:
         return messages
 
+    completes_tool_sequence = _find_completed_tool_sequences(messages)
+
     # Work backwards to find the last complete turn
     for i in range(len(messages) - 1, -1, -1):
         current_message = messages[i]
@@ -418,37 +576,138 @@ def get_last_complete_conversation_turn(
             return messages[: i + 1]
 
         # If we find an AIMessage without tool calls, this is a complete response
-        if isinstance(current_message, AIMessage) and (
-            not hasattr(current_message, "tool_calls") or not current_message.tool_calls
+        if isinstance(current_message, AIMessage) and not getattr(
+            current_message, "tool_calls", None
         ):
             return messages[: i + 1]
 
-        # If we find a ToolMessage, look for the corresponding AIMessage
-        if isinstance(current_message, ToolMessage):
-            # Find the AIMessage that initiated this tool call
-            for j in range(i - 1, -1, -1):
-                if (
-                    isinstance(messages[j], AIMessage)
-                    and hasattr(messages[j], "tool_calls")
-                    and messages[j].tool_calls
-                ):
-                    # Check if this tool call sequence is complete
-                    ai_msg = messages[j]
-                    tool_call_ids = {tc["id"] for tc in ai_msg.tool_calls}
-
-                    # Count responses between j+1 and i+1
-                    found_responses = set()
-                    for k in range(j + 1, i + 1):
-                        if isinstance(messages[k], ToolMessage) and hasattr(
-                            messages[k], "tool_call_id"
-                        ):
-                            if messages[k].tool_call_id in tool_call_ids:
-                                found_responses.add(messages[k].tool_call_id)
-
-                    if found_responses == tool_call_ids:
-                        # Complete tool sequence found
-                        return messages[: i + 1]
-                    break
+        # If we find a ToolMessage that completes its tool call sequence
+        if completes_tool_sequence[i]:
+            return messages[: i + 1]
 
     # If no complete turn found, return empty list or first message only
     return messages[:1] if messages else []
+
+
+def add_messages_with_token_counts(
+    left: Messages, right: Messages
+) -> List[BaseMessage]:
+    """
+    `add_messages` reducer that also counts the tokens of incoming messages.
+
+    Counting happens once when a message enters the graph state, so
+    `trim_by_cached_tokens` only has to sum cached values on each model call.
+
+    Args:
+        left: Current messages in the state
+        right: Messages to merge into the state
+
+    Returns:
+        List[BaseMessage]: Merged messages
+    """
+    merged = add_messages(left, right)
+    for message in merged:
+        get_cached_token_count(message)
+    return merged
+
+
+def _token_count_key(message: BaseMessage) -> Optional[Tuple[str, int]]:
+    """
+    Build the token count cache key for a message.
+
+    Args:
+        message: Message to key
+
+    Returns:
+        Optional[Tuple[str, int]]: Message id and a fingerprint of everything the
+        approximate count reads, or None for messages without an id
+    """
+    if not message.id:
+        return None
+    content = message.content
+    content_hash = hash(content) if isinstance(content, str) else hash(repr(content))
+    tool_calls = getattr(message, "tool_calls", None)
+    tool_calls_repr = repr(tool_calls) if tool_calls else None
+    return message.id, hash((message.type, content_hash, tool_calls_repr))
+
+
+def get_cached_token_count(message: BaseMessage) -> int:
+    """
+    Get the approximate token count of a message, computing it at most once.
+
+    Counts are kept in a module-level map keyed by message id and a content
+    fingerprint, so messages carried over between turns are not recounted,
+    while a copy with different content is counted afresh.
+
+    Args:
+        message: Message to count
+
+    Returns:
+        int: Approximate token count of the message
+    """
+    key = _token_count_key(message)
+    if key is None:
+        return count_tokens_approximately([message])
+
+    with _token_count_cache_lock:
+        token_count = _token_count_cache.get(key)
+        if token_count is not None:
+            _token_count_cache.move_to_end(key)
+            return token_count
+
+    token_count = count_tokens_approximately([message])
+    with _token_count_cache_lock:
+        _token_count_cache[key] = token_count
+        _token_count_cache.move_to_end(key)
+        if len(_token_count_cache) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
+    return token_count
+
+
+def trim_by_cached_tokens(
+    messages: List[BaseMessage],
+    max_tokens: int,
+    start_on: Tuple[Type[BaseMessage], ...] = (HumanMessage,),
+    end_on: Tuple[Type[BaseMessage], ...] = (HumanMessage, ToolMessage),
+) -> List[BaseMessage]:
+    """
+    Keep the most recent messages that fit within a token budget.
+
+    Equivalent to `trim_messages(strategy="last")` with
+    `count_tokens_approximately`, but uses per-message cached counts and a
+    running sum, dropping messages from the front until the budget fits.
+    When the whole history already fits, the input list is returned as is.
+
+    Args:
+        messages: Conversation messages, oldest first
+        max_tokens: Maximum total approximate tokens to keep
+        start_on: Message types the trimmed history may start on
+        end_on: Message types the trimmed history may end on
+
+    Returns:
+        List[BaseMessage]: Trimmed messages
+    """
+    end = len(messages)
+    while end > 0 and not isinstance(messages[end - 1], end_on):
+        end -= 1
+
+    counts = [get_cached_token_count(message) for message in messages[:end]]
+    total = sum(counts)
+
+    # Common case early in a conversation: nothing needs trimming
+    if (
+        total <= max_tokens
+        and end == len(messages)
+        and (end == 0 or isinstance(messages[0], start_on))
+    ):
+        return messages
+
+    start = 0
+    while start < end and total > max_tokens:
+        total -= counts[start]
+        start += 1
+
+    while start < end and not isinstance(messages[start], start_on):
+        start += 1
+
+    return messages[start:end]
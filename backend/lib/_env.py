@@ -0,0 +1,26 @@
+"""One-time loading of environment variables from the .env file."""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+_LOADED = False
+_LOCK = threading.Lock()
+
+
+def ensure_loaded() -> None:
+    """Load the .env file into the environment once per process.
+
+    Later calls return immediately without re-reading or re-parsing the file.
+    With ENV=production the file is skipped and the process environment is
+    used as-is.
+    """
+    global _LOADED
+    if _LOADED:
+        return
+    with _LOCK:
+        if not _LOADED:
+            if os.getenv("ENV") != "production":
+                load_dotenv()
+            _LOADED = True
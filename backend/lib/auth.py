@@ -1,13 +1,14 @@
 """Authentication utilities for the FastAPI server."""
+import logging
 import os
 import secrets
 from typing import Annotated
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from dotenv import load_dotenv
+from lib._env import ensure_loaded
 
 # Load environment variables
-load_dotenv()
+ensure_loaded()
 
 # Initialize HTTP Basic Auth
 security = HTTPBasic(auto_error=False)
@@ -16,6 +17,12 @@ security = HTTPBasic(auto_error=False)
 BACKEND_AUTH_USERNAME = os.getenv("BACKEND_AUTH_USERNAME", "apiuser")
 BACKEND_AUTH_PASSWORD = os.getenv("BACKEND_AUTH_PASSWORD", "securepass123")
 
+# Encoded once for the constant-time comparisons in verify_credentials
+_USERNAME_BYTES = BACKEND_AUTH_USERNAME.encode("utf-8")
+_PASSWORD_BYTES = BACKEND_AUTH_PASSWORD.encode("utf-8")
+
+logger = logging.getLogger(__name__)
+
 
 def verify_credentials(credentials: Annotated[HTTPBasicCredentials, Depends(security)]) -> str:
     """
@@ -30,21 +37,18 @@ def verify_credentials(credentials: Annotated[HTTPBasicCredentials, Depends(secu
     Raises:
         HTTPException: If authentication fails
     """
-    print("🔐 Verifying credentials for user:", credentials.username)
-    print("   Provided password length:", len(credentials.password) * "*")
+    logger.debug("Verifying credentials for user: %s", credentials.username)
 
     # Use secrets.compare_digest to prevent timing attacks
     is_correct_username = secrets.compare_digest(
-        credentials.username.encode("utf-8"), 
-        BACKEND_AUTH_USERNAME.encode("utf-8")
+        credentials.username.encode("utf-8"), _USERNAME_BYTES
     )
     is_correct_password = secrets.compare_digest(
-        credentials.password.encode("utf-8"), 
-        BACKEND_AUTH_PASSWORD.encode("utf-8")
+        credentials.password.encode("utf-8"), _PASSWORD_BYTES
     )
     
     if not (is_correct_username and is_correct_password):
-        print("❌ Authentication failed for user:", credentials.username)
+        logger.warning("Authentication failed for user: %s", credentials.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
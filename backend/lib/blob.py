@@ -1,39 +1,95 @@
 """Azure Blob Storage operations."""
 
+import functools
 import os
-from datetime import datetime, timedelta
-from typing import BinaryIO
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Tuple
 
-from azure.storage.blob import BlobSasPermissions, BlobServiceClient, generate_blob_sas
+from azure.storage.blob import (
+    BlobClient,
+    BlobSasPermissions,
+    BlobServiceClient,
+    generate_blob_sas,
+)
 
+from lib._env import ensure_loaded
 
+ensure_loaded()
+
+# Storage configuration, read once at import
+AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING", "default")
+AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "default")
+
+# Uploads at least this large send their blocks over several connections
+PARALLEL_UPLOAD_THRESHOLD = 4 * 1024 * 1024
+
+# Seconds a SAS link is reused for. Links are signed for the requested expiry
+# plus this window, so a reused link still has the full requested expiry left.
+SAS_REUSE_WINDOW = 3300
+_SAS_CACHE_SIZE = 1024
+# (blob name, expiry) -> (SAS URL, link expiry on the monotonic clock)
+_sas_cache: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+_sas_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
 def get_blob_service_client() -> BlobServiceClient:
-    """Get Azure Blob Service client."""
-    return BlobServiceClient.from_connection_string(
-        os.getenv("AZURE_STORAGE_CONNECTION_STRING", "default")
+    """Get the shared Azure Blob Service client."""
+    return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_blob_client(blob_name: str) -> BlobClient:
+    """Get a client for a blob in the file container, reused per blob name."""
+    return get_blob_service_client().get_blob_client(
+        container=AZURE_STORAGE_CONTAINER_NAME, blob=blob_name
     )
 
 
-def upload_file_to_blob(file: bytes, blob_name: str) -> str:
+@functools.lru_cache(maxsize=8)
+def _expiry_delta(seconds: int) -> timedelta:
+    """Get the SAS lifetime as a timedelta, shared across calls."""
+    return timedelta(seconds=seconds)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_account_credentials() -> Tuple[str, str]:
+    """Get the storage account name and key used to sign SAS tokens."""
+    blob_service_client = get_blob_service_client()
+    account_name = blob_service_client.account_name
+    if account_name is None:
+        raise ValueError("Account Name is None")
+    return account_name, blob_service_client.credential.account_key
+
+
+def upload_file_to_blob(file: bytes, blob_name: str, max_concurrency: int = 4) -> str:
     """
     Upload a file to Azure Blob Storage.
 
+    Files of at least `PARALLEL_UPLOAD_THRESHOLD` bytes upload their blocks
+    with up to `max_concurrency` connections; smaller ones use one.
+
     Args:
         file: File object to upload
         blob_name: Name for the blob in storage
+        max_concurrency: Maximum parallel block uploads for large files
 
     Returns:
         str: The blob name
     """
-    blob_service_client = get_blob_service_client()
-    container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "default")
-
-    blob_client = blob_service_client.get_blob_client(
-        container=container_name, blob=blob_name
-    )
+    blob_client = _get_blob_client(blob_name)
+    length = len(file)
 
     # Upload the file
-    blob_client.upload_blob(file, overwrite=True)
+    blob_client.upload_blob(
+        file,
+        length=length,
+        overwrite=True,
+        max_concurrency=max_concurrency if length >= PARALLEL_UPLOAD_THRESHOLD else 1,
+    )
 
     return blob_name
 
@@ -48,12 +104,7 @@ def get_file_link(blob_name: str) -> str:
     Returns:
         str: URL to the blob
     """
-    blob_service_client = get_blob_service_client()
-    container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "default")
-
-    blob_client = blob_service_client.get_blob_client(
-        container=container_name, blob=blob_name
-    )
+    blob_client = _get_blob_client(blob_name)
 
     return blob_client.url
 
@@ -62,6 +113,11 @@ def get_file_temporary_link(blob_name: str, expiry: int = 3600) -> str:
     """
     Get a temporary link to a blob with SAS token.
 
+    Links are signed for `expiry + SAS_REUSE_WINDOW` seconds and cached per
+    blob and expiry. A cached link is returned while more than `expiry`
+    seconds remain, so every returned link is valid for at least `expiry`
+    seconds and each link is reused for up to `SAS_REUSE_WINDOW` seconds.
+
     Args:
         blob_name: Name of the blob
         expiry: Expiry time in seconds (default: 1 hour)
@@ -69,29 +125,37 @@ def get_file_temporary_link(blob_name: str, expiry: int = 3600) -> str:
     Returns:
         str: URL with SAS token
     """
-    blob_service_client = get_blob_service_client()
-    container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "default")
+    cache_key = (blob_name, expiry)
+    lifetime = expiry + SAS_REUSE_WINDOW
+    now = time.monotonic()
+    with _sas_cache_lock:
+        cached = _sas_cache.get(cache_key)
+        if cached is not None and cached[1] - now > expiry:
+            _sas_cache.move_to_end(cache_key)
+            return cached[0]
 
-    blob_client = blob_service_client.get_blob_client(
-        container=container_name, blob=blob_name
-    )
+    blob_client = _get_blob_client(blob_name)
 
-    account_name = blob_service_client.account_name
-    if account_name is None:
-        raise ValueError("Account Name is None")
+    account_name, account_key = _get_account_credentials()
 
     # Generate SAS token
     sas_token = generate_blob_sas(
         account_name=account_name,
-        container_name=container_name,
+        container_name=blob_client.container_name,
         blob_name=blob_name,
-        account_key=blob_service_client.credential.account_key,
+        account_key=account_key,
         permission=BlobSasPermissions(read=True),
-        expiry=datetime.utcnow() + timedelta(seconds=expiry),
+        expiry=datetime.now(timezone.utc) + _expiry_delta(lifetime),
     )
 
     # Construct URL with SAS token
-    return f"{blob_client.url}?{sas_token}"
+    url = f"{blob_client.url}?{sas_token}"
+    with _sas_cache_lock:
+        _sas_cache[cache_key] = (url, now + lifetime)
+        _sas_cache.move_to_end(cache_key)
+        if len(_sas_cache) > _SAS_CACHE_SIZE:
+            _sas_cache.popitem(last=False)
+    return url
 
 
 def delete_file(blob_name: str) -> bool:
@@ -104,12 +168,7 @@ def delete_file(blob_name: str) -> bool:
     Returns:
         bool: True if deleted successfully
     """
-    blob_service_client = get_blob_service_client()
-    container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "default")
-
-    blob_client = blob_service_client.get_blob_client(
-        container=container_name, blob=blob_name
-    )
+    blob_client = _get_blob_client(blob_name)
 
     blob_client.delete_blob()
 
@@ -1,26 +1,35 @@
-import dotenv
-dotenv.load_dotenv()
-
+import logging
 import os
-from langgraph_checkpoint_cosmosdb import CosmosDBSaver
+import threading
+
+from lib._env import ensure_loaded
+
+ensure_loaded()
+
+logger = logging.getLogger(__name__)
 
-required_env = [
+_REQUIRED_COSMOS_ENV = (
     "COSMOS_ENDPOINT",
     "COSMOS_KEY",
     "COSMOS_DATABASE_NAME",
-]
+)
 
-not_present_env = [var for var in required_env if var not in os.environ]
+# Snapshot of the Cosmos settings, read once at import
+_ENV = {var: os.environ[var] for var in _REQUIRED_COSMOS_ENV if var in os.environ}
+
+not_present_env = [var for var in _REQUIRED_COSMOS_ENV if var not in _ENV]
 if not_present_env:
     raise EnvironmentError(
         f"Missing required environment variables: {', '.join(not_present_env)}"
     )
 
-os.environ["COSMOSDB_ENDPOINT"] = os.getenv("COSMOS_ENDPOINT")
-os.environ["COSMOSDB_KEY"] = os.getenv("COSMOS_KEY")
+os.environ["COSMOSDB_ENDPOINT"] = _ENV["COSMOS_ENDPOINT"]
+os.environ["COSMOSDB_KEY"] = _ENV["COSMOS_KEY"]
 
 # Global cached checkpointer instance
 _checkpointer_instance = None
+_checkpointer_lock = threading.Lock()
+
 
 def checkpointer():
     """Get or create the cached checkpointer instance.
@@ -32,8 +41,13 @@ def checkpointer():
     if _checkpointer_instance is not None:
         return _checkpointer_instance
     
-    _checkpointer_instance = CosmosDBSaver(database_name=os.getenv("COSMOS_DATABASE_NAME"), container_name='langgraph_checkpoints')
-    
-    print("✅ Checkpointer initialized and cached")
+    # Concurrent first calls must not each build a saver and Cosmos client
+    with _checkpointer_lock:
+        if _checkpointer_instance is None:
+            from langgraph_checkpoint_cosmosdb import CosmosDBSaver
+            
+            _checkpointer_instance = CosmosDBSaver(database_name=_ENV["COSMOS_DATABASE_NAME"], container_name='langgraph_checkpoints')
+            
+            logger.info("Checkpointer initialized and cached")
     
     return _checkpointer_instance
\ No newline at end of file
@@ -1,12 +1,22 @@
 """Database models and operations for conversation and file metadata - Cosmos DB."""
+import functools
+import threading
 import time
-from typing import List, Optional, Union, Dict, Any
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple, Union, Dict, Any
 from dataclasses import dataclass, asdict
 from lib.db_connection import db_connection
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 
+# Items fetched per Cosmos page when iterating a user's records
+QUERY_PAGE_SIZE = 100
 
-@dataclass
+# Positive *_exists results are trusted for this many seconds
+EXISTS_CACHE_TTL = 30
+_EXISTS_CACHE_SIZE = 4096
+
+
+@dataclass(slots=True, frozen=True)
 class ConversationMetadata:
     """Conversation metadata model."""
     id: str
@@ -16,7 +26,7 @@ class ConversationMetadata:
     created_at: int  # epoch timestamp
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FileMetadata:
     """File metadata model."""
     file_id: str
@@ -29,7 +39,7 @@ class FileMetadata:
     error_message: Optional[str] = None
     workflow_id: Optional[str] = None  # orchestration workflow ID
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Attachment:
     """Attachment model. Abstraction layer over Azure Blob Storage for langgraph file ingestion in a chat conversation."""
     id: str # Must be a random long string
@@ -40,30 +50,84 @@ class Attachment:
     created_at: int  # epoch timestamp
     metadata: Optional[Dict[str, Any]] = None  # JSON metadata
 
+def _conversation_from_item(item: Dict[str, Any]) -> ConversationMetadata:
+    """Build conversation metadata from a stored document."""
+    return ConversationMetadata(
+        id=item['id'],
+        userid=item['userid'],
+        is_pinned=item['is_pinned'],
+        created_at=item['created_at'],
+        title=item.get('title', None)
+    )
+
+def _file_from_item(item: Dict[str, Any]) -> FileMetadata:
+    """Build file metadata from a stored document."""
+    return FileMetadata(
+        file_id=item['file_id'],
+        userid=item['userid'],
+        filename=item['filename'],
+        blob_name=item['blob_name'],
+        status=item['status'],
+        uploaded_at=item['uploaded_at'],
+        indexed_at=item.get('indexed_at'),
+        error_message=item.get('error_message'),
+        workflow_id=item.get('workflow_id')
+    )
+
+def _attachment_from_item(item: Dict[str, Any]) -> Attachment:
+    """Build an attachment from a stored document."""
+    return Attachment(
+        id=item['id'],
+        userid=item['userid'],
+        filename=item['filename'],
+        blob_name=item['blob_name'],
+        type=item['type'],
+        created_at=item['created_at'],
+        metadata=item.get('metadata')
+    )
+
 class DatabaseManager:
     """database manager for conversation and file metadata using Cosmos DB."""
     
     def __init__(self):
-        pass
+        # (kind, item id, userid) -> expiry on the monotonic clock
+        self._exists_cache: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._exists_cache_lock = threading.Lock()
+    
+    def _is_known_to_exist(self, key: Tuple[str, str, str]) -> bool:
+        """Check whether an item was recently confirmed to exist."""
+        with self._exists_cache_lock:
+            expires_at = self._exists_cache.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._exists_cache[key]
+                return False
+            return True
+    
+    def _remember_exists(self, key: Tuple[str, str, str]):
+        """Record that an item exists, evicting the oldest entry when full."""
+        with self._exists_cache_lock:
+            self._exists_cache[key] = time.monotonic() + EXISTS_CACHE_TTL
+            self._exists_cache.move_to_end(key)
+            if len(self._exists_cache) > _EXISTS_CACHE_SIZE:
+                self._exists_cache.popitem(last=False)
+    
+    def _forget_exists(self, key: Tuple[str, str, str]):
+        """Drop a cached existence result after the item is deleted."""
+        with self._exists_cache_lock:
+            self._exists_cache.pop(key, None)
 
     def rename_conversation(self, conversation_id: str, userid: str, new_title: str) -> bool:
         """Rename a conversation."""
         container = db_connection.get_conversations_container()
         
         try:
-            # Read the item first
-            item = container.read_item(
-                item=conversation_id,
-                partition_key=userid
-            )
-            
-            # Update the title field
-            item['title'] = new_title
-
-            # Replace the item
-            container.replace_item(
+            # Set the title server-side
+            container.patch_item(
                 item=conversation_id,
-                body=item
+                partition_key=userid,
+                patch_operations=[{"op": "set", "path": "/title", "value": new_title}]
             )
             
             return True
@@ -104,40 +168,30 @@ class DatabaseManager:
                 partition_key=userid
             )
             
-            return ConversationMetadata(
-                id=item['id'],
-                userid=item['userid'],
-                is_pinned=item['is_pinned'],
-                created_at=item['created_at'],
-                title=item.get('title', None)
-            )
+            return _conversation_from_item(item)
         except CosmosResourceNotFoundError:
             return None
     
-    def get_user_conversations(self, userid: str) -> List[ConversationMetadata]:
-        """Get all conversations for a user, ordered by created_at descending."""
+    def iter_user_conversations(self, userid: str) -> Iterator[ConversationMetadata]:
+        """Yield a user's conversations, newest first, one query page at a time."""
         container = db_connection.get_conversations_container()
         
-        query = "SELECT * FROM c WHERE c.userid = @userid ORDER BY c.created_at DESC"
+        query = "SELECT c.id, c.userid, c.is_pinned, c.created_at, c.title FROM c WHERE c.userid = @userid ORDER BY c.created_at DESC"
         parameters = [{"name": "@userid", "value": userid}]
         
         items = container.query_items(
             query=query,
             parameters=parameters,
-            partition_key=userid
+            partition_key=userid,
+            max_item_count=QUERY_PAGE_SIZE
         )
         
-        conversations = []
         for item in items:
-            conversations.append(ConversationMetadata(
-                id=item['id'],
-                userid=item['userid'],
-                is_pinned=item['is_pinned'],
-                created_at=item['created_at'],
-                title=item.get('title', None)
-            ))
-        
-        return conversations
+            yield _conversation_from_item(item)
+    
+    def get_user_conversations(self, userid: str) -> List[ConversationMetadata]:
+        """Get all conversations for a user, ordered by created_at descending."""
+        return list(self.iter_user_conversations(userid))
     
     def get_last_conversation_id(self, userid: str) -> Optional[str]:
         """Get the last conversation ID for a user."""
@@ -152,29 +206,19 @@ class DatabaseManager:
             partition_key=userid
         )
         
-        for item in items:
-            return item['id']
-        
-        return None
+        item = next(iter(items), None)
+        return item['id'] if item else None
     
     def pin_conversation(self, conversation_id: str, userid: str, is_pinned: bool = True) -> bool:
         """Pin or unpin a conversation."""
         container = db_connection.get_conversations_container()
         
         try:
-            # Read the item first
-            item = container.read_item(
-                item=conversation_id,
-                partition_key=userid
-            )
-            
-            # Update the is_pinned field
-            item['is_pinned'] = is_pinned
-            
-            # Replace the item
-            container.replace_item(
+            # Set the is_pinned field server-side
+            container.patch_item(
                 item=conversation_id,
-                body=item
+                partition_key=userid,
+                patch_operations=[{"op": "set", "path": "/is_pinned", "value": is_pinned}]
             )
             
             return True
@@ -193,9 +237,15 @@ class DatabaseManager:
             return True
         except CosmosResourceNotFoundError:
             return False
+        finally:
+            self._forget_exists(("conversation", conversation_id, userid))
     
     def conversation_exists(self, conversation_id: str, userid: str) -> bool:
         """Check if a conversation exists for a user."""
+        key = ("conversation", conversation_id, userid)
+        if self._is_known_to_exist(key):
+            return True
+        
         container = db_connection.get_conversations_container()
         
         try:
@@ -203,6 +253,7 @@ class DatabaseManager:
                 item=conversation_id,
                 partition_key=userid
             )
+            self._remember_exists(key)
             return True
         except CosmosResourceNotFoundError:
             return False
@@ -249,70 +300,48 @@ class DatabaseManager:
                 partition_key=userid
             )
             
-            return FileMetadata(
-                file_id=item['file_id'],
-                userid=item['userid'],
-                filename=item['filename'],
-                blob_name=item['blob_name'],
-                status=item['status'],
-                uploaded_at=item['uploaded_at'],
-                indexed_at=item.get('indexed_at'),
-                error_message=item.get('error_message'),
-                workflow_id=item.get('workflow_id')
-            )
+            return _file_from_item(item)
         except CosmosResourceNotFoundError:
             return None
     
-    def get_user_files(self, userid: str) -> List[FileMetadata]:
-        """Get all files for a user, ordered by uploaded_at descending."""
+    def iter_user_files(self, userid: str) -> Iterator[FileMetadata]:
+        """Yield a user's files, newest first, one query page at a time."""
         container = db_connection.get_files_container()
         
-        query = "SELECT * FROM c WHERE c.userid = @userid ORDER BY c.uploaded_at DESC"
+        query = "SELECT c.file_id, c.userid, c.filename, c.blob_name, c.status, c.uploaded_at, c.indexed_at, c.error_message, c.workflow_id FROM c WHERE c.userid = @userid ORDER BY c.uploaded_at DESC"
         parameters = [{"name": "@userid", "value": userid}]
         
         items = container.query_items(
             query=query,
             parameters=parameters,
-            partition_key=userid
+            partition_key=userid,
+            max_item_count=QUERY_PAGE_SIZE
         )
         
-        files = []
         for item in items:
-            files.append(FileMetadata(
-                file_id=item['file_id'],
-                userid=item['userid'],
-                filename=item['filename'],
-                blob_name=item['blob_name'],
-                status=item['status'],
-                uploaded_at=item['uploaded_at'],
-                indexed_at=item.get('indexed_at'),
-                error_message=item.get('error_message'),
-                workflow_id=item.get('workflow_id')
-            ))
-        
-        return files
+            yield _file_from_item(item)
+    
+    def get_user_files(self, userid: str) -> List[FileMetadata]:
+        """Get all files for a user, ordered by uploaded_at descending."""
+        return list(self.iter_user_files(userid))
     
     def update_file_status(self, file_id: str, userid: str, status: str, error_message: Optional[str] = None) -> bool:
         """Update file indexing status."""
         container = db_connection.get_files_container()
         
+        patch_operations = [
+            {"op": "set", "path": "/status", "value": status},
+            {"op": "set", "path": "/error_message", "value": error_message},
+        ]
+        if status == "completed":
+            patch_operations.append({"op": "set", "path": "/indexed_at", "value": int(time.time())})
+        
         try:
-            # Read the item first
-            item = container.read_item(
-                item=file_id,
-                partition_key=userid
-            )
-            
-            # Update fields
-            item['status'] = status
-            item['error_message'] = error_message
-            if status == "completed":
-                item['indexed_at'] = int(time.time())
-            
-            # Replace the item
-            container.replace_item(
+            # Update fields server-side
+            container.patch_item(
                 item=file_id,
-                body=item
+                partition_key=userid,
+                patch_operations=patch_operations
             )
             
             return True
@@ -324,19 +353,11 @@ class DatabaseManager:
         container = db_connection.get_files_container()
         
         try:
-            # Read the item first
-            item = container.read_item(
-                item=file_id,
-                partition_key=userid
-            )
-            
-            # Update workflow_id
-            item['workflow_id'] = workflow_id
-            
-            # Replace the item
-            container.replace_item(
+            # Set workflow_id server-side
+            container.patch_item(
                 item=file_id,
-                body=item
+                partition_key=userid,
+                patch_operations=[{"op": "set", "path": "/workflow_id", "value": workflow_id}]
             )
             
             return True
@@ -355,9 +376,15 @@ class DatabaseManager:
             return True
         except CosmosResourceNotFoundError:
             return False
+        finally:
+            self._forget_exists(("file", file_id, userid))
     
     def file_exists(self, file_id: str, userid: str) -> bool:
         """Check if a file exists."""
+        key = ("file", file_id, userid)
+        if self._is_known_to_exist(key):
+            return True
+        
         container = db_connection.get_files_container()
         
         try:
@@ -365,6 +392,7 @@ class DatabaseManager:
                 item=file_id,
                 partition_key=userid
             )
+            self._remember_exists(key)
             return True
         except CosmosResourceNotFoundError:
             return False
@@ -398,80 +426,73 @@ class DatabaseManager:
             metadata=metadata
         )
     
-    def get_attachment(self, attachment_id: str) -> Optional[Attachment]:
-        """Get attachment by ID."""
+    def get_attachment(self, attachment_id: str, userid: str) -> Optional[Attachment]:
+        """Get attachment by ID and userid."""
         container = db_connection.get_attachments_container()
         
         try:
-            query = "SELECT * FROM c WHERE c.id = @id"
-            parameters = [{"name": "@id", "value": attachment_id}]
-            
-            items = list(container.query_items(
-                query=query,
-                parameters=parameters,
-                enable_cross_partition_query=True
-            ))
-            
-            for item in items:
-                return Attachment(
-                    id=item['id'],
-                    userid=item['userid'],
-                    filename=item['filename'],
-                    blob_name=item['blob_name'],
-                    type=item['type'],
-                    created_at=item['created_at'],
-                    metadata=item.get('metadata')
-                )
+            item = container.read_item(
+                item=attachment_id,
+                partition_key=userid
+            )
             
-            return None
+            return _attachment_from_item(item)
         except CosmosResourceNotFoundError:
             return None
     
-    def get_user_attachments(self, userid: str) -> List[Attachment]:
-        """Get all attachments for a user, ordered by created_at descending."""
+    def get_attachments_by_ids(self, attachment_ids: List[str]) -> Dict[str, Attachment]:
+        """Get several attachments by ID in a single query, keyed by ID."""
+        if not attachment_ids:
+            return {}
+        
         container = db_connection.get_attachments_container()
         
-        query = "SELECT * FROM c WHERE c.userid = @userid ORDER BY c.created_at DESC"
-        parameters = [{"name": "@userid", "value": userid}]
+        query = "SELECT c.id, c.userid, c.filename, c.blob_name, c.type, c.created_at, c.metadata FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+        parameters = [{"name": "@ids", "value": list(attachment_ids)}]
         
         items = container.query_items(
             query=query,
             parameters=parameters,
-            partition_key=userid
+            enable_cross_partition_query=True
         )
         
-        attachments = []
+        attachments = {}
         for item in items:
-            attachments.append(Attachment(
-                id=item['id'],
-                userid=item['userid'],
-                filename=item['filename'],
-                blob_name=item['blob_name'],
-                type=item['type'],
-                created_at=item['created_at'],
-                metadata=item.get('metadata')
-            ))
+            attachments[item['id']] = _attachment_from_item(item)
         
         return attachments
     
+    def iter_user_attachments(self, userid: str) -> Iterator[Attachment]:
+        """Yield a user's attachments, newest first, one query page at a time."""
+        container = db_connection.get_attachments_container()
+        
+        query = "SELECT c.id, c.userid, c.filename, c.blob_name, c.type, c.created_at, c.metadata FROM c WHERE c.userid = @userid ORDER BY c.created_at DESC"
+        parameters = [{"name": "@userid", "value": userid}]
+        
+        items = container.query_items(
+            query=query,
+            parameters=parameters,
+            partition_key=userid,
+            max_item_count=QUERY_PAGE_SIZE
+        )
+        
+        for item in items:
+            yield _attachment_from_item(item)
+    
+    def get_user_attachments(self, userid: str) -> List[Attachment]:
+        """Get all attachments for a user, ordered by created_at descending."""
+        return list(self.iter_user_attachments(userid))
+    
     def update_attachment_metadata(self, attachment_id: str, userid: str, metadata: Optional[Dict[str, Any]]) -> bool:
         """Update attachment metadata."""
         container = db_connection.get_attachments_container()
         
         try:
-            # Read the item first
-            item = container.read_item(
-                item=attachment_id,
-                partition_key=userid
-            )
-            
-            # Update the metadata field
-            item['metadata'] = metadata
-            
-            # Replace the item
-            container.replace_item(
+            # Set the metadata field server-side
+            container.patch_item(
                 item=attachment_id,
-                body=item
+                partition_key=userid,
+                patch_operations=[{"op": "set", "path": "/metadata", "value": metadata}]
             )
             
             return True
@@ -483,19 +504,11 @@ class DatabaseManager:
         container = db_connection.get_attachments_container()
         
         try:
-            # Read the item first
-            item = container.read_item(
-                item=attachment_id,
-                partition_key=userid
-            )
-            
-            # Update the type field
-            item['type'] = attachment_type
-            
-            # Replace the item
-            container.replace_item(
+            # Set the type field server-side
+            container.patch_item(
                 item=attachment_id,
-                body=item
+                partition_key=userid,
+                patch_operations=[{"op": "set", "path": "/type", "value": attachment_type}]
             )
             
             return True
@@ -514,9 +527,15 @@ class DatabaseManager:
             return True
         except CosmosResourceNotFoundError:
             return False
+        finally:
+            self._forget_exists(("attachment", attachment_id, userid))
     
     def attachment_exists(self, attachment_id: str, userid: str) -> bool:
         """Check if an attachment exists."""
+        key = ("attachment", attachment_id, userid)
+        if self._is_known_to_exist(key):
+            return True
+        
         container = db_connection.get_attachments_container()
         
         try:
@@ -524,9 +543,22 @@ class DatabaseManager:
                 item=attachment_id,
                 partition_key=userid
             )
+            self._remember_exists(key)
             return True
         except CosmosResourceNotFoundError:
             return False
 
-# Global database manager instance
-db_manager = DatabaseManager()
\ No newline at end of file
+@functools.lru_cache(maxsize=1)
+def get_db_manager() -> DatabaseManager:
+    """Get the shared database manager, creating it on first use."""
+    return DatabaseManager()
+
+def __getattr__(name: str) -> DatabaseManager:
+    """Resolve the legacy global ``db_manager`` through ``get_db_manager``.
+    
+    Prefer calling ``get_db_manager()`` where the manager is used; importing
+    ``db_manager`` by name creates it at import time.
+    """
+    if name == "db_manager":
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,9 +1,32 @@
 """Database connection factory - Azure Cosmos DB."""
+import logging
 import os
+import threading
 from typing import Optional
-from azure.cosmos.aio import CosmosClient
+import requests
+from azure.core.pipeline.transport import RequestsTransport
 from azure.cosmos import CosmosClient as SyncCosmosClient
 from azure.cosmos import PartitionKey
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Pooled connections kept per Cosmos endpoint, sized for concurrent requests
+COSMOS_POOL_SIZE = int(os.getenv("COSMOS_POOL_SIZE", "32"))
+
+
+def _build_transport() -> RequestsTransport:
+    """Build a Cosmos transport backed by a pooled requests session.
+    
+    The SDK default pool is too small for concurrent FastAPI handlers, so
+    requests queue for a connection and tail latency grows under load.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=COSMOS_POOL_SIZE, pool_maxsize=COSMOS_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session)
 
 class CosmosDBConnection:
     """Async Cosmos DB connection manager."""
@@ -20,43 +43,88 @@ class CosmosDBConnection:
         self.attachments_container = "attachments"
         
         # Client instance
-        self._client: Optional[CosmosClient] = None
+        self._client: Optional[SyncCosmosClient] = None
         self._database = None
         self._conversations_container = None
         self._files_container = None
+        self._attachments_container = None
+        self._init_lock = threading.Lock()
     
-    async def init_cosmos_client(self):
-        """Initialize Cosmos DB client and containers."""
-        if not self._client:
+    def init_cosmos_client(self):
+        """Initialize Cosmos DB client and containers.
+        
+        Makes blocking SDK calls; async callers should run it in a worker
+        thread. The client is only published once every container exists, so
+        a failed init leaves the connection uninitialized rather than half-built.
+        """
+        if self._client:
+            return
+        
+        # Concurrent startup paths must not create the client twice
+        with self._init_lock:
+            if self._client:
+                return
+            
             if not self.endpoint or not self.key:
                 raise ValueError("COSMOS_ENDPOINT and COSMOS_KEY must be set in environment variables")
             
-            self._client = SyncCosmosClient(self.endpoint, self.key)
+            client = SyncCosmosClient(self.endpoint, self.key, transport=_build_transport())
             
             # Create database if not exists
-            self._database = self._client.create_database_if_not_exists(id=self.database_name)
+            database = client.create_database_if_not_exists(id=self.database_name)
             
             # Create conversations container with userid as partition key
-            self._conversations_container = self._database.create_container_if_not_exists(
+            conversations_container = database.create_container_if_not_exists(
                 id=self.conversations_container,
                 partition_key=PartitionKey(path="/userid")
             )
             
             # Create files container with userid as partition key
-            self._files_container = self._database.create_container_if_not_exists(
+            files_container = database.create_container_if_not_exists(
                 id=self.files_container,
                 partition_key=PartitionKey(path="/userid")
             )
 
             # Create attachments container with userid as partition key
-            self._database.create_container_if_not_exists(
+            attachments_container = database.create_container_if_not_exists(
                 id=self.attachments_container,
                 partition_key=PartitionKey(path="/userid")
             )
             
-            print("✅ Cosmos DB client initialized")
-            print(f"   Database: {self.database_name}")
-            print(f"   Containers: {self.conversations_container}, {self.files_container}, {self.attachments_container}")
+            self._database = database
+            self._conversations_container = conversations_container
+            self._files_container = files_container
+            self._attachments_container = attachments_container
+            self._client = client
+            
+            logger.info(
+                "Cosmos DB client initialized (database: %s, containers: %s, %s, %s)",
+                self.database_name,
+                self.conversations_container,
+                self.files_container,
+                self.attachments_container,
+            )
+            
+            self._warmup_containers()
+    
+    def _warmup_containers(self):
+        """Prime the connection pool with a cheap point-read per container.
+        
+        The first real read otherwise pays for channel setup, which shows up
+        as a latency spike on the first request after every deploy. Warmup is
+        best-effort: failures are logged and never fail initialization.
+        """
+        for container in (
+            self._conversations_container,
+            self._files_container,
+            self._attachments_container,
+        ):
+            try:
+                container.read_item(item="__warmup__", partition_key="__warmup__")
+            except CosmosResourceNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("Cosmos DB warmup read on %s failed: %s", container.id, e)
     
     async def close_cosmos_client(self):
         """Close Cosmos DB client."""
@@ -66,7 +134,8 @@ class CosmosDBConnection:
             self._database = None
             self._conversations_container = None
             self._files_container = None
-            print("🔌 Cosmos DB client closed")
+            self._attachments_container = None
+            logger.info("Cosmos DB client closed")
     
     def get_conversations_container(self):
         """Get conversations container."""
@@ -82,9 +151,9 @@ class CosmosDBConnection:
     
     def get_attachments_container(self):
         """Get attachments container."""
-        if not self._database:
+        if not self._attachments_container:
             raise RuntimeError("Cosmos DB client not initialized. Call init_cosmos_client() first.")
-        return self._database.get_container_client(self.attachments_container)
+        return self._attachments_container
 
 # Global database connection instance
 db_connection = CosmosDBConnection()
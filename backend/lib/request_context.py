@@ -0,0 +1,56 @@
+"""Per-request context shared with code that runs outside route handlers."""
+
+import contextvars
+import logging
+import uuid
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# ID of the HTTP request being served, set by the middleware in main.py
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+
+class RequestIdFilter(logging.Filter):
+    """Copy the current request ID onto each log record as ``request_id``.
+
+    Records logged outside a request get ``"-"``, so formats referencing
+    ``%(request_id)s`` work for every record.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get() or "-"
+        return True
+
+
+class RequestIdMiddleware:
+    """Bind the request ID to the current context for log correlation.
+
+    Uses the incoming X-Request-ID header when present, otherwise a new ID,
+    and echoes it back on the response. Written as plain ASGI so responses,
+    including streamed ones, pass through without an extra task or wrapper.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = current_id
+            await send(message)
+
+        token = request_id.set(current_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
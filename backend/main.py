@@ -1,14 +1,16 @@
 """Main FastAPI server with LangGraph integration."""
 
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
 
 sys.dont_write_bytecode = True
 
 # Load environment variables
-from dotenv import load_dotenv
+from lib._env import ensure_loaded
 
-load_dotenv()
+ensure_loaded()
 
 # Disable Azure Cosmos DB HTTP logging
 import logging
@@ -16,13 +18,49 @@ import logging
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from lib.db_connection import db_connection
+from lib.request_context import RequestIdFilter, RequestIdMiddleware
 from routes.attachment import attachment_routes
 
+# Include the request ID in every log line; replaces the bare basicConfig
+# applied when the route modules are imported
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s",
+    force=True,
+)
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
+
 logging.getLogger("azure.cosmos._cosmos_http_logging_policy").setLevel(logging.WARNING)
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up Cosmos DB and agent dependencies before the server accepts requests."""
+    try:
+        await asyncio.to_thread(db_connection.init_cosmos_client)
+    except Exception as e:
+        logger.warning("Cosmos DB initialization skipped: %s", e)
+
+    try:
+        from agent.prompt import warmup as warmup_prompt
+        from agent.tools import log_registered_tools
+
+        log_registered_tools(logger)
+        await asyncio.to_thread(warmup_prompt)
+    except Exception as e:
+        logger.warning("Prompt warmup skipped: %s", e)
+    yield
+    await db_connection.close_cosmos_client()
+
 
 # Initialize FastAPI app
-app = FastAPI(title="LangGraph Azure Inference API", version="1.0.0")
+app = FastAPI(
+    title="LangGraph Azure Inference API", version="1.0.0", lifespan=lifespan
+)
 
 # Add CORS middleware to allow all origins
 app.add_middleware(
@@ -33,6 +71,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Bind a request ID for log correlation
+app.add_middleware(RequestIdMiddleware)
+
 app.include_router(
     attachment_routes,
     prefix="/api/v1/attachments",
@@ -1,5 +1,6 @@
 """Attachment routes for multimodal chat input."""
 
+import asyncio
 import logging
 import uuid
 from typing import Any, Dict, Optional
@@ -8,7 +9,7 @@ from fastapi import APIRouter, File, Header, HTTPException, UploadFile, status
 from pydantic import BaseModel
 
 from lib.blob import delete_file, get_file_temporary_link, upload_file_to_blob
-from lib.database import db_manager
+from lib.database import get_db_manager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -61,6 +62,8 @@ async def upload_attachment(file: UploadFile = File(...)):
         )
 
     try:
+        db_manager = get_db_manager()
+
         # Generate unique IDs
         attachment_id = str(uuid.uuid4())
         blob_name = f"attachments/{userid}/{attachment_id}_{file.filename}"
@@ -74,10 +77,11 @@ async def upload_attachment(file: UploadFile = File(...)):
 
         # Upload to Azure Blob Storage
         file_content = await file.read()
-        upload_file_to_blob(file_content, blob_name)
+        await asyncio.to_thread(upload_file_to_blob, file_content, blob_name)
 
         # Add to attachment database record
-        db_manager.create_attachment(
+        await asyncio.to_thread(
+            db_manager.create_attachment,
             attachment_id=attachment_id,
             userid=userid,
             filename=file.filename or "unknown",
@@ -121,8 +125,10 @@ def get_attachment_by_id(attachment_id: str):
         )
 
     try:
+        db_manager = get_db_manager()
+
         # Get from database
-        attachment = db_manager.get_attachment(attachment_id)
+        attachment = db_manager.get_attachment(attachment_id, userid)
 
         if not attachment:
             raise HTTPException(
@@ -169,7 +175,11 @@ async def get_all_attachments(userid: str | None = Header(None)):
         )
 
     try:
-        attachments = db_manager.get_user_attachments(userid)
+        db_manager = get_db_manager()
+
+        attachments = await asyncio.to_thread(
+            db_manager.get_user_attachments, userid
+        )
 
         return {
             "userid": userid,
@@ -214,8 +224,12 @@ async def update_attachment_metadata(attachment_id: str, metadata: Dict[str, Any
         )
 
     try:
+        db_manager = get_db_manager()
+
         # Verify attachment exists
-        attachment = db_manager.get_attachment(attachment_id)
+        attachment = await asyncio.to_thread(
+            db_manager.get_attachment, attachment_id, userid
+        )
 
         if not attachment:
             raise HTTPException(
@@ -224,10 +238,14 @@ async def update_attachment_metadata(attachment_id: str, metadata: Dict[str, Any
             )
 
         # Update metadata
-        db_manager.update_attachment_metadata(attachment_id, userid, metadata)
+        await asyncio.to_thread(
+            db_manager.update_attachment_metadata, attachment_id, userid, metadata
+        )
 
         # Get updated attachment
-        updated_attachment = db_manager.get_attachment(attachment_id)
+        updated_attachment = await asyncio.to_thread(
+            db_manager.get_attachment, attachment_id, userid
+        )
         if updated_attachment is None:
             raise ValueError("Updated Attachment not found")
         blob_url = get_file_temporary_link(updated_attachment.blob_name, expiry=3600)
@@ -273,8 +291,12 @@ async def delete_attachment(attachment_id: str):
         )
 
     try:
+        db_manager = get_db_manager()
+
         # Get from database
-        attachment = db_manager.get_attachment(attachment_id)
+        attachment = await asyncio.to_thread(
+            db_manager.get_attachment, attachment_id, userid
+        )
 
         if not attachment:
             raise HTTPException(
@@ -283,10 +305,10 @@ async def delete_attachment(attachment_id: str):
             )
 
         # Delete from blob storage
-        delete_file(attachment.blob_name)
+        await asyncio.to_thread(delete_file, attachment.blob_name)
 
         # Delete from database
-        db_manager.delete_attachment(attachment_id, userid)
+        await asyncio.to_thread(db_manager.delete_attachment, attachment_id, userid)
 
         logger.info(f"Attachment deleted successfully: {attachment_id}")
 
@@ -322,7 +344,11 @@ async def get_user_attachments():
         )
 
     try:
-        attachments = db_manager.get_user_attachments(userid)
+        db_manager = get_db_manager()
+
+        attachments = await asyncio.to_thread(
+            db_manager.get_user_attachments, userid
+        )
 
         return {
             "userid": userid,